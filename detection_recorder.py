@@ -0,0 +1,211 @@
+import glob
+import os
+import queue
+import re
+import threading
+import time
+import cv2
+import numpy as np
+
+
+def _chunk_paths(path):
+    """根据记录路径返回所有分块文件路径，例如 record.npz -> record_0000.npz, record_0001.npz"""
+    base, _ = os.path.splitext(path)
+    chunk_pattern = re.compile(re.escape(os.path.basename(base)) + r"_(\d+)\.npz$")
+    chunks = []
+    for chunk_path in glob.glob(f"{glob.escape(base)}_*.npz"):
+        match = chunk_pattern.match(os.path.basename(chunk_path))
+        if match:
+            chunks.append((int(match.group(1)), chunk_path))
+    return [chunk_path for _, chunk_path in sorted(chunks)]
+
+
+class DetectionRecorder:
+    """记录detect_vehicles的原始输出，用于脱离模型的回放测试"""
+
+    def __init__(self, path, save_thumbnails=True, thumbnail_size=32, chunk_frames=300):
+        # 已存在同名记录时改用带时间戳的文件名，不覆盖之前的录制
+        if _chunk_paths(path):
+            base, ext = os.path.splitext(path)
+            new_path = f"{base}_{time.strftime('%Y%m%d_%H%M%S')}{ext}"
+            print(f"检测记录 {path} 已存在，本次记录改为写入 {new_path}")
+            path = new_path
+        self.path = path
+        self.save_thumbnails = save_thumbnails
+        self.thumbnail_size = thumbnail_size  # 缩略图边长（像素）
+        self.chunk_frames = chunk_frames      # 每累计多少帧写入一个分块文件，限制内存占用
+        self.frame_shape = None
+        self.timestamps = []   # 每帧时间戳
+        self.detections = []   # 每帧检测结果 [x1,y1,x2,y2,conf,class_id]
+        self.thumbnails = []   # 每帧的ROI缩略图列表
+        self.chunk_index = 0   # 下一个分块文件序号
+        self.written_paths = []  # 已成功写入的分块文件
+        self.total_frames = 0    # 已写入文件的帧数
+        self.closed = False
+        self.lock = threading.Lock()  # record与close可能在不同线程中调用
+
+        # 压缩和写文件较慢，放到单独的线程中进行，避免阻塞检测线程
+        self.write_queue = queue.Queue()
+        self.writer_thread = threading.Thread(target=self._writer_loop, daemon=True)
+        self.writer_thread.start()
+
+    def record(self, frame, detections, timestamp):
+        """记录一帧的检测结果"""
+        detections = np.asarray(detections, dtype=np.float32).reshape(-1, 6)
+        thumbs = self._extract_thumbnails(frame, detections) if self.save_thumbnails else None
+        with self.lock:
+            if self.closed:
+                return
+            if self.frame_shape is None:
+                self.frame_shape = frame.shape
+            self.detections.append(detections)
+            if thumbs is not None:
+                self.thumbnails.append(thumbs)
+            self.timestamps.append(timestamp)
+            if len(self.timestamps) >= self.chunk_frames:
+                self._submit_chunk()
+
+    def _extract_thumbnails(self, frame, detections):
+        """截取每个检测框的ROI并缩放为固定尺寸"""
+        size = self.thumbnail_size
+        h, w = frame.shape[:2]
+        thumbs = np.zeros((len(detections), size, size, 3), dtype=np.uint8)
+        for i, det in enumerate(detections):
+            x1, y1, x2, y2 = map(int, det[:4])
+            # 边界框越界处理
+            x1, y1 = max(0, x1), max(0, y1)
+            x2, y2 = min(w, x2), min(h, y2)
+            roi = frame[y1:y2, x1:x2]
+            if roi.size:
+                thumbs[i] = cv2.resize(roi, (size, size), interpolation=cv2.INTER_AREA)
+        return thumbs
+
+    def _submit_chunk(self):
+        """将内存中的记录交给写入线程并清空，调用方需持有锁"""
+        if not self.timestamps:
+            return
+        base, _ = os.path.splitext(self.path)
+        chunk_path = f"{base}_{self.chunk_index:04d}.npz"
+        self.write_queue.put((chunk_path, self.frame_shape, self.timestamps,
+                              self.detections, self.thumbnails))
+        self.chunk_index += 1
+        self.timestamps, self.detections, self.thumbnails = [], [], []
+
+    def _writer_loop(self):
+        """写入线程，逐个将分块写入文件"""
+        while True:
+            chunk = self.write_queue.get()
+            if chunk is None:
+                break
+            self._write_chunk(*chunk)
+
+    def _write_chunk(self, chunk_path, frame_shape, timestamps, detections, thumbnails):
+        """将一个分块写入压缩文件（.npz）"""
+        # 所有帧的检测结果拼接存储，offsets记录每帧的起止位置
+        counts = [len(d) for d in detections]
+        offsets = np.concatenate(([0], np.cumsum(counts))).astype(np.int64)
+        arrays = {
+            'timestamps': np.asarray(timestamps, dtype=np.float64),
+            'frame_shape': np.asarray(frame_shape, dtype=np.int64),
+            'offsets': offsets,
+            'detections': np.concatenate(detections),
+        }
+        if self.save_thumbnails:
+            arrays['thumbnails'] = np.concatenate(thumbnails)
+
+        # 先写临时文件再重命名，写入中途崩溃不会留下不完整的分块
+        tmp_path = chunk_path + ".tmp"
+        try:
+            with open(tmp_path, 'wb') as f:
+                np.savez_compressed(f, **arrays)
+            os.replace(tmp_path, chunk_path)
+        except Exception as e:
+            print(f"检测记录写入失败: {e}")
+            return
+        self.written_paths.append(chunk_path)
+        self.total_frames += len(timestamps)
+
+    def close(self):
+        """写入剩余记录并停止记录"""
+        with self.lock:
+            if self.closed:
+                return
+            self._submit_chunk()
+            self.closed = True
+        self.write_queue.put(None)
+        self.writer_thread.join()
+        if self.written_paths:
+            print(f"检测记录已保存: {self.written_paths[0]} ~ {self.written_paths[-1]}"
+                  f"（{len(self.written_paths)}个分块，共{self.total_frames}帧），回放路径: {self.path}")
+        else:
+            print("没有可保存的检测记录")
+
+
+class DetectionReplayer:
+    """回放DetectionRecorder保存的检测记录"""
+
+    def __init__(self, path):
+        # 读取DetectionRecorder写出的全部分块，无法读取的分块跳过
+        timestamps, offsets, detections, thumbnails = [], [np.zeros(1, np.int64)], [], []
+        self.frame_shape = None
+        loaded = 0
+        for chunk_path in _chunk_paths(path):
+            try:
+                with np.load(chunk_path) as data:
+                    chunk = {name: data[name] for name in data.files}
+            except Exception as e:
+                print(f"警告：跳过无法读取的检测记录分块 {chunk_path}: {e}")
+                continue
+            if self.frame_shape is None:
+                self.frame_shape = tuple(chunk['frame_shape'])
+            # 分块内的offsets从0开始，拼接时需要加上之前分块的检测数量
+            offsets.append(chunk['offsets'][1:] + offsets[-1][-1])
+            timestamps.append(chunk['timestamps'])
+            detections.append(chunk['detections'])
+            if 'thumbnails' in chunk:
+                thumbnails.append(chunk['thumbnails'])
+            loaded += 1
+
+        if not loaded:
+            raise FileNotFoundError(f"检测记录不存在或无法读取: {path}")
+
+        self.timestamps = np.concatenate(timestamps)
+        self.offsets = np.concatenate(offsets)
+        self.detections = np.concatenate(detections)
+        self.thumbnails = np.concatenate(thumbnails) if len(thumbnails) == loaded else None
+
+    def __len__(self):
+        return len(self.timestamps)
+
+    def _build_frame(self, start, end):
+        """根据缩略图合成一帧图像，供颜色检测使用"""
+        frame = np.zeros(self.frame_shape, dtype=np.uint8)
+        if self.thumbnails is None:
+            return frame
+        h, w = frame.shape[:2]
+        for det, thumb in zip(self.detections[start:end], self.thumbnails[start:end]):
+            x1, y1, x2, y2 = map(int, det[:4])
+            x1, y1 = max(0, x1), max(0, y1)
+            x2, y2 = min(w, x2), min(h, y2)
+            if x2 > x1 and y2 > y1:
+                frame[y1:y2, x1:x2] = cv2.resize(thumb, (x2 - x1, y2 - y1))
+        return frame
+
+    def frames(self, speed=1.0):
+        """
+        逐帧生成 (timestamp, frame, detections)
+        参数:
+            speed: 回放倍速，1.0为实时，<=0表示以最快速度回放
+        """
+        prev_ts = None
+        prev_wall = None
+        for i, timestamp in enumerate(self.timestamps):
+            if speed > 0 and prev_ts is not None:
+                # 按与上一帧的录制间隔控制节奏，暂停等停顿不会导致之后的帧集中输出
+                delay = (timestamp - prev_ts) / speed - (time.time() - prev_wall)
+                if delay > 0:
+                    time.sleep(delay)
+            prev_ts = timestamp
+            prev_wall = time.time()
+            start, end = self.offsets[i], self.offsets[i + 1]
+            yield float(timestamp), self._build_frame(start, end), self.detections[start:end]
@@ -0,0 +1,98 @@
+import threading
+import time
+from collections import deque
+import numpy as np
+
+
+# 默认降级等级，从0（不降级）到最高等级逐步减小推理负载
+DEFAULT_LEVELS = [
+    {'imgsz': 640, 'detect_stride': 1, 'detect_color': True, 'display_fps': 30},
+    {'imgsz': 480, 'detect_stride': 1, 'detect_color': True, 'display_fps': 20},
+    {'imgsz': 480, 'detect_stride': 2, 'detect_color': True, 'display_fps': 15},
+    {'imgsz': 320, 'detect_stride': 2, 'detect_color': False, 'display_fps': 10},
+    {'imgsz': 320, 'detect_stride': 3, 'detect_color': False, 'display_fps': 5},
+]
+
+
+class LatencyGovernor:
+    """根据采集→发布的端到端延迟p95自动调整降级等级"""
+
+    def __init__(self, name, target_p95=0.5, window=30, levels=None,
+                 recover_ratio=0.6, recover_hold=10.0):
+        self.name = name                    # 摄像头名称，用于日志
+        self.target_p95 = target_p95        # 目标p95延迟（秒）
+        self.levels = levels or DEFAULT_LEVELS
+        self.recover_ratio = recover_ratio  # p95低于 target*recover_ratio 时才考虑恢复
+        self.recover_hold = recover_hold    # 恢复前需保持低延迟的时间（秒），避免来回抖动
+        self.level = 0
+        self.latencies = deque(maxlen=window)  # 当前等级下的延迟样本
+        self.changes = deque(maxlen=50)        # 等级变更记录
+        self.last_change_time = time.time()
+        self.lock = threading.Lock()
+
+    def current(self):
+        """返回当前等级的参数配置"""
+        return self.levels[self.level]
+
+    def p95(self):
+        """当前窗口内延迟的p95（秒），无样本时返回0"""
+        with self.lock:
+            return self._p95()
+
+    def _p95(self):
+        if not self.latencies:
+            return 0.0
+        return float(np.percentile(self.latencies, 95))
+
+    def record(self, latency):
+        """
+        记录一次延迟并按需调整等级
+        返回:
+            等级是否发生变化
+        """
+        with self.lock:
+            self.latencies.append(latency)
+            # 窗口未满时样本不足，不做调整
+            if len(self.latencies) < self.latencies.maxlen:
+                return False
+
+            p95 = self._p95()
+            now = time.time()
+            if p95 > self.target_p95 and self.level < len(self.levels) - 1:
+                self._set_level(self.level + 1, p95, now)
+                return True
+            if (p95 < self.target_p95 * self.recover_ratio and self.level > 0
+                    and now - self.last_change_time >= self.recover_hold):
+                self._set_level(self.level - 1, p95, now)
+                return True
+            return False
+
+    def _set_level(self, new_level, p95, now):
+        """切换等级并记录日志，清空样本以便评估新等级下的延迟"""
+        old_level = self.level
+        self.level = new_level
+        self.last_change_time = now
+        self.latencies.clear()
+        self.changes.append({
+            'time': now,
+            'from': old_level,
+            'to': new_level,
+            'p95': round(p95, 3),
+        })
+        action = "降级" if new_level > old_level else "恢复"
+        print(f"[延迟调控] {self.name} {action}: 等级 {old_level} -> {new_level}，"
+              f"p95={p95 * 1000:.0f}ms，目标={self.target_p95 * 1000:.0f}ms，"
+              f"参数={self.levels[new_level]}")
+
+    def status(self):
+        """返回当前状态，供显示或上报使用"""
+        with self.lock:
+            return {
+                'camera': self.name,
+                'level': self.level,
+                'degraded': self.level > 0,
+                'p95': round(self._p95(), 3),
+                'target_p95': self.target_p95,
+                'settings': dict(self.levels[self.level]),
+                'changes': list(self.changes),
+            }
@@ -6,6 +6,8 @@ import sys
 import numpy as np
 from vehicle_detector import VehicleDetector
 from tcp_server import VehicleTCPServer
+from detection_recorder import DetectionRecorder, DetectionReplayer
+from latency_governor import LatencyGovernor
 
 
 class TrafficMonitoringSystem:
@@ -19,16 +21,36 @@ class TrafficMonitoringSystem:
             'server_port': 9999,
             'show_video': True,
             'run_server': False,
-            'camera_matrix': np.array([[1000, 0, 320], [0, 1000, 240], [0, 0, 1]])
+            'camera_matrix': np.array([[1000, 0, 320], [0, 1000, 240], [0, 0, 1]]),
+            'record_path': None,  # 记录检测结果的文件路径（.npz），None表示不记录
+            'record_thumbnails': True,  # 记录时是否保存ROI缩略图（用于回放时的颜色检测）
+            'replay_path': None,  # 回放检测记录的文件路径，设置后不加载模型、不读取摄像头
+            'replay_speed': 1.0,  # 回放倍速，1.0为实时，<=0表示最快速度
+            'latency_target_p95': None,  # 采集→发布延迟的p95目标（秒），如0.5；None表示不启用自动降级
+            'governor_status_interval': 60  # 自动降级状态日志和状态消息的输出间隔（秒）
         }
 
         # 初始化组件
-        self.detector = VehicleDetector(self.config['camera_matrix'])
+        replay = self.config['replay_path'] is not None
+        self.detector = VehicleDetector(self.config['camera_matrix'], load_model=not replay)
+        if self.config['record_path'] and not replay:
+            self.detector.recorder = DetectionRecorder(
+                self.config['record_path'], save_thumbnails=self.config['record_thumbnails']
+            )
         self.tcp_server = VehicleTCPServer(self.config['server_host'], self.config['server_port'])
+        self.governor = None
+        if self.config['latency_target_p95'] is not None and not replay:
+            self.governor = LatencyGovernor(
+                str(self.config['camera_source']), target_p95=self.config['latency_target_p95']
+            )
 
         # 系统状态变量
         self.running = False
         self.frame = None
+        self.frame_time = 0.0  # 当前帧的采集时间
+        self.frame_id = 0  # 当前帧序号，用于判断是否有未处理的新帧
+        self.detect_stride = 1  # 每隔多少个处理周期检测一次
+        self.display_fps = 30  # 显示帧率上限
         self.detected_vehicles = []  # 存储检测到的车辆数据
         self.is_paused = False
         self.lock = threading.Lock()  # 线程同步锁
@@ -52,9 +74,12 @@ class TrafficMonitoringSystem:
         if self.config['run_server']:
             self.tcp_server.start()
 
-        # 启动各个工作线程
-        threading.Thread(target=self._camera_loop, daemon=True).start()
-        threading.Thread(target=self._processing_loop, daemon=True).start()
+        # 启动各个工作线程（回放模式下由回放线程代替摄像头和检测线程）
+        if self.config['replay_path'] is not None:
+            threading.Thread(target=self._replay_loop, daemon=True).start()
+        else:
+            threading.Thread(target=self._camera_loop, daemon=True).start()
+            threading.Thread(target=self._processing_loop, daemon=True).start()
 
         # 如果需要显示视频，启动显示线程
         if self.config['show_video']:
@@ -63,9 +88,15 @@ class TrafficMonitoringSystem:
         print("系统启动成功")
 
         # 主循环
+        last_status_time = time.time()
         try:
             while self.running:
                 time.sleep(1)
+                # 定期输出自动降级状态，便于运维确认站点是否降级运行
+                if self.governor and time.time() - last_status_time >= self.config['governor_status_interval']:
+                    self._log_governor_status()
+                    self._publish_governor_status()
+                    last_status_time = time.time()
         except KeyboardInterrupt:
             self.stop()
 
@@ -78,7 +109,7 @@ class TrafficMonitoringSystem:
 
         if not cap.isOpened():
             print("无法打开摄像头/视频")
-            self.running = False
+            self.stop()
             return
 
         while self.running:
@@ -92,6 +123,8 @@ class TrafficMonitoringSystem:
             # 线程安全地更新当前帧
             with self.lock:
                 self.frame = frame.copy()
+                self.frame_time = time.time()
+                self.frame_id += 1
 
             time.sleep(0.03)  # 控制帧率
 
@@ -99,23 +132,30 @@ class TrafficMonitoringSystem:
 
     def _processing_loop(self):
         """车辆检测处理线程"""
+        last_frame_id = 0
         while self.running:
             # 处理暂停状态
             while self.is_paused and self.running:
                 time.sleep(0.1)
 
+            pass_start = time.time()
             current_frame = None
-            # 线程安全地获取当前帧
+            capture_time = 0.0
+            # 线程安全地获取当前帧（只处理新帧）
             with self.lock:
-                if self.frame is not None:
+                if self.frame is not None and self.frame_id != last_frame_id:
                     current_frame = self.frame.copy()
+                    capture_time = self.frame_time
+                    last_frame_id = self.frame_id
 
             if current_frame is not None:
                 try:
                     # 检测车辆
-                    vehicles = self.detector.process_frame(current_frame)
+                    vehicles = self.detector.process_frame(current_frame, capture_time)
                     # 转换为字典列表
                     vehicle_dicts = [v.to_dict() for v in vehicles]
+                    # 附加到数据中的延迟只能在发送前测量，不含发送耗时
+                    self._annotate_latency(vehicle_dicts, time.time() - capture_time)
 
                     # 线程安全地更新检测结果
                     with self.lock:
@@ -125,10 +165,89 @@ class TrafficMonitoringSystem:
                     if self.config['run_server']:
                         self.tcp_server.send_data(vehicle_dicts)
 
+                    # 记录发送完成后的采集→发布延迟（含发送耗时），必要时调整降级等级
+                    if self.governor and self.governor.record(time.time() - capture_time):
+                        self._apply_degradation(self.governor.current())
+                        self._publish_governor_status()
+
                 except Exception as e:
                     print(f"处理帧出错: {e}")
 
             time.sleep(0.05)
+            # 检测间隔为N时，空闲N-1个与本次同样时长的处理周期，按比例降低推理负载
+            if current_frame is not None and self.detect_stride > 1:
+                time.sleep((self.detect_stride - 1) * (time.time() - pass_start))
+
+    def _annotate_latency(self, vehicle_dicts, latency):
+        """启用自动降级时，为车辆数据附加采集→发布延迟和降级等级，便于客户端判断数据新鲜度"""
+        if not self.governor:
+            return
+        level = self.governor.level
+        for vehicle in vehicle_dicts:
+            vehicle['latency'] = round(latency, 3)
+            vehicle['degradation_level'] = level
+
+    def _log_governor_status(self):
+        """输出自动降级的当前状态和最近一次等级变更"""
+        status = self.governor.status()
+        message = (f"[延迟调控] {status['camera']} 状态: 等级 {status['level']}"
+                   f"{'（降级运行）' if status['degraded'] else ''}，"
+                   f"p95={status['p95'] * 1000:.0f}ms，目标={status['target_p95'] * 1000:.0f}ms，"
+                   f"参数={status['settings']}，等级变更{len(status['changes'])}次")
+        if status['changes']:
+            last = status['changes'][-1]
+            changed_at = time.strftime('%H:%M:%S', time.localtime(last['time']))
+            message += f"，最近一次 {changed_at} 等级 {last['from']} -> {last['to']}"
+        print(message)
+
+    def _publish_governor_status(self):
+        """将自动降级状态作为单独的消息发送给客户端（type为governor_status）"""
+        if self.config['run_server']:
+            self.tcp_server.send_data({'type': 'governor_status', **self.governor.status()})
+
+    def _apply_degradation(self, settings):
+        """应用降级等级对应的参数"""
+        self.detector.imgsz = settings['imgsz']
+        self.detector.aggregator.detect_color = settings['detect_color']
+        self.detect_stride = settings['detect_stride']
+        self.display_fps = settings['display_fps']
+
+    def _replay_loop(self):
+        """检测记录回放线程，不依赖模型和视频"""
+        try:
+            replayer = DetectionReplayer(self.config['replay_path'])
+        except Exception as e:
+            print(f"无法加载检测记录: {e}")
+            self.stop()
+            return
+
+        start_time = time.time()
+        frame_count = 0
+        for timestamp, frame, detections in replayer.frames(self.config['replay_speed']):
+            if not self.running:
+                break
+            # 处理暂停状态
+            while self.is_paused and self.running:
+                time.sleep(0.1)
+
+            try:
+                vehicles = self.detector.process_detections(frame, detections, timestamp)
+                vehicle_dicts = [v.to_dict() for v in vehicles]
+
+                with self.lock:
+                    self.frame = frame
+                    self.detected_vehicles = vehicle_dicts
+
+                if self.config['run_server']:
+                    self.tcp_server.send_data(vehicle_dicts)
+            except Exception as e:
+                print(f"回放帧出错: {e}")
+            frame_count += 1
+
+        elapsed = time.time() - start_time
+        fps = frame_count / elapsed if elapsed > 0 else 0.0
+        print(f"回放结束：{frame_count}帧，耗时{elapsed:.2f}秒（{fps:.1f}帧/秒）")
+        self.stop()
 
     def _display_loop(self):
         """视频显示线程"""
@@ -153,6 +272,7 @@ class TrafficMonitoringSystem:
             print("警告：未加载中文字体，中文可能显示异常")
 
         while self.running:
+            loop_start = time.time()
             current_frame = None
             current_vehicles = []
 
@@ -197,6 +317,18 @@ class TrafficMonitoringSystem:
                             1  # 线宽（更细）
                         )
 
+                # 降级运行时在画面上提示当前等级和延迟
+                if self.governor and self.governor.level > 0:
+                    cv2.putText(
+                        current_frame,
+                        f"DEGRADED L{self.governor.level} p95={self.governor.p95() * 1000:.0f}ms",
+                        (10, 30),
+                        cv2.FONT_HERSHEY_SIMPLEX,
+                        0.7,
+                        (0, 0, 255),
+                        2
+                    )
+
                 # 显示图像
                 cv2.imshow("交通监控系统", current_frame)
 
@@ -207,12 +339,21 @@ class TrafficMonitoringSystem:
                 elif key == ord('p'):  # 按p暂停/继续
                     self.is_paused = not self.is_paused
 
+            # 启用自动降级时控制显示帧率
+            if self.governor:
+                delay = 1.0 / self.display_fps - (time.time() - loop_start)
+                if delay > 0:
+                    time.sleep(delay)
+
         cv2.destroyAllWindows()
 
     def stop(self):
         """停止系统"""
         self.running = False
         self.tcp_server.stop()
+        recorder, self.detector.recorder = self.detector.recorder, None
+        if recorder is not None:
+            recorder.close()
         print("系统已停止")
 
 
@@ -15,12 +15,13 @@ class SpeedCalculator:
         """计算两点之间的位移（欧氏距离）"""
         return np.sqrt((curr_pos[0] - prev_pos[0]) ** 2 + (curr_pos[1] - prev_pos[1]) ** 2)
 
-    def update_position(self, vehicle_id, bbox):
+    def update_position(self, vehicle_id, bbox, timestamp=None):
         """
         更新车辆位置并计算速度
         参数:
             vehicle_id: 车辆唯一标识
             bbox: 边界框 (x1, y1, x2, y2)
+            timestamp: 帧时间戳，默认使用当前时间（回放时传入录制时间）
         返回:
             当前计算的速度 (km/h)
         """
@@ -28,7 +29,7 @@ class SpeedCalculator:
         x1, y1, x2, y2 = bbox
         center_x = (x1 + x2) / 2
         center_y = (y1 + y2) / 2
-        current_time = time.time()  # 使用当前时间戳
+        current_time = time.time() if timestamp is None else timestamp
 
         # 初始化该车辆的轨迹记录
         if vehicle_id not in self.track_history:
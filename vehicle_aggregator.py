@@ -11,18 +11,28 @@ class VehicleAggregator:
         self.speed_calculator = SpeedCalculator(speed_factor=speed_factor)
         self.track_history = self.speed_calculator.track_history  # 复用轨迹数据
         self.color_threshold = 50  # 颜色检测阈值
+        self.detect_color = True  # 关闭时沿用该车辆上次检测到的颜色，降低负载
+        self.last_colors = {}  # {vehicle_id: color}
 
-    def get_vehicle_features(self, frame, bbox, vehicle_id):
+    def get_vehicle_features(self, frame, bbox, vehicle_id, timestamp=None):
         """提取颜色和速度特征"""
-        x1, y1, x2, y2 = map(int, bbox)
-        h, w = frame.shape[:2]
-        # 边界框越界处理
-        x1, y1 = max(0, x1), max(0, y1)
-        x2, y2 = min(w, x2), min(h, y2)
-        roi = frame[y1:y2, x1:x2]
+        if self.detect_color:
+            x1, y1, x2, y2 = map(int, bbox)
+            h, w = frame.shape[:2]
+            # 边界框越界处理
+            x1, y1 = max(0, x1), max(0, y1)
+            x2, y2 = min(w, x2), min(h, y2)
+            roi = frame[y1:y2, x1:x2]
 
-        color = self.color_detector.detect_color(roi)  # 统一调用detect_color
-        speed = self.speed_calculator.update_position(vehicle_id, bbox)
+            color = self.color_detector.detect_color(roi)  # 统一调用detect_color
+            # 清理旧的颜色记录（超过一定数量时）
+            if len(self.last_colors) > 100:
+                self.last_colors = {k: v for k, v in list(self.last_colors.items())[-50:]}
+            self.last_colors.pop(vehicle_id, None)  # 移到末尾，保证清理时保留最近出现的车辆
+            self.last_colors[vehicle_id] = color
+        else:
+            color = self.last_colors.get(vehicle_id, "unknown")
+        speed = self.speed_calculator.update_position(vehicle_id, bbox, timestamp)
         return color, speed
 
     def clear_expired_tracks(self, max_age=5.0):
@@ -7,25 +7,29 @@ import time
 
 
 class VehicleDetector:
-    def __init__(self, camera_matrix=None, speed_factor=0.036):
-        # 加载YOLO模型
-        try:
-            self.detection_model = YOLO("models/yolov8n.pt")
-            print("YOLO模型加载成功")
-        except Exception as e:
-            print(f"模型加载失败: {e}")
-            raise
+    def __init__(self, camera_matrix=None, speed_factor=0.036, load_model=True):
+        # 加载YOLO模型（回放模式下不需要模型）
+        self.detection_model = None
+        if load_model:
+            try:
+                self.detection_model = YOLO("models/yolov8n.pt")
+                print("YOLO模型加载成功")
+            except Exception as e:
+                print(f"模型加载失败: {e}")
+                raise
 
         # 初始化聚合器，传递速度因子
         self.aggregator = VehicleAggregator(speed_factor=speed_factor)
         # 统一车辆类别映射（与YOLO官方ID匹配）
         self.vehicle_classes = {2: "car", 3: "motorcycle", 5: "bus", 7: "truck"}
         self.conf_threshold = 0.5  # 置信度阈值
+        self.imgsz = 640  # 推理输入尺寸，负载过高时可调小
 
         # 车辆ID跟踪改进：使用字典存储检测框与ID的映射，提高连续性
         self.vehicle_ids = {}  # {检测框哈希值: vehicle_id}
         self.next_vehicle_id = 0  # 下一个可用ID
         self.debug = True
+        self.recorder = None  # 可选的DetectionRecorder，用于记录检测结果
 
     def _get_vehicle_id(self, bbox):
         """
@@ -66,10 +70,20 @@ class VehicleDetector:
             self.next_vehicle_id += 1
             return new_id
 
-    def process_frame(self, frame):
-        """处理单帧并返回车辆数据列表"""
-        vehicles = []
+    def process_frame(self, frame, timestamp=None):
+        """处理单帧并返回车辆数据列表，timestamp为帧的采集时间，默认取检测开始前的时间"""
+        if timestamp is None:
+            timestamp = time.time()
         detections = self.detect_vehicles(frame)
+        if self.recorder is not None:
+            self.recorder.record(frame, detections, timestamp)
+        return self.process_detections(frame, detections, timestamp)
+
+    def process_detections(self, frame, detections, timestamp=None):
+        """根据检测结果（实时检测或回放记录）生成车辆数据列表"""
+        vehicles = []
+        if timestamp is None:
+            timestamp = time.time()
         if not detections.size:
             return vehicles
 
@@ -91,7 +105,7 @@ class VehicleDetector:
                 vehicle_id = self._get_vehicle_id(bbox)
 
                 # 调用聚合器获取颜色和速度
-                color, speed = self.aggregator.get_vehicle_features(frame, bbox, vehicle_id)
+                color, speed = self.aggregator.get_vehicle_features(frame, bbox, vehicle_id, timestamp)
 
                 vehicles.append(VehicleData(
                     id=vehicle_id,
@@ -100,7 +114,7 @@ class VehicleDetector:
                     color=color,
                     speed=speed,
                     confidence=float(conf),
-                    timestamp=time.time()  # 使用更精确的时间戳
+                    timestamp=timestamp
                 ))
             except Exception as e:
                 print(f"处理检测结果出错: {e}")
@@ -110,11 +124,14 @@ class VehicleDetector:
 
     def detect_vehicles(self, frame):
         """检测车辆并返回边界框数据"""
+        if self.detection_model is None:
+            return np.array([])
         try:
             results = self.detection_model(
                 frame,
                 conf=self.conf_threshold,
                 classes=[2, 3, 5, 7],  # 只检测车辆类别
+                imgsz=self.imgsz,
                 verbose=False
             )
             if not results or not results[0].boxes: